@@ -1,10 +1,11 @@
 # ----------------------------
 import sys
 import os
-import time
 import random
+from itertools import combinations
 import xml.etree.ElementTree as ET
-import math
+import logging
+import numpy as np
 
 # -------------------- SUMO PATH SETUP --------------------
 if 'SUMO_HOME' not in os.environ:
@@ -14,12 +15,19 @@ tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
 if tools not in sys.path:
     sys.path.append(tools)
 
-import traci
-import sumolib
+from sumo_backend import traci, SUMO_BINARY, pace_step
+from traci import constants as tc
+
+# ----------------------------
+# Logging: SIM_LOG_LEVEL (default INFO, same as run_simulation.py); accidents are INFO,
+# per-vehicle spawn lines are DEBUG
+logging.basicConfig(format="%(message)s")
+log = logging.getLogger("accident")
+log.setLevel(os.environ.get("SIM_LOG_LEVEL", "INFO"))
 
 # ----------------------------
 # SUMO setup
-sumoBinary = sumolib.checkBinary("sumo-gui")
+sumoBinary = SUMO_BINARY  # sumo or sumo-gui, chosen in sumo_backend (--headless / USE_LIBSUMO)
 sumoConfig = "simulation.sumocfg"
 
 # ----------------------------
@@ -39,6 +47,9 @@ NUM_INITIAL_VEHICLES = 8
 SPAWN_INTERVAL = 10
 VEHICLE_COUNTER = 0
 COLLISION_DISTANCE = 2.5  # meters threshold
+COLLISION_DISTANCE_SQ = COLLISION_DISTANCE ** 2
+SUBSCRIBED_VARS = [tc.VAR_POSITION, tc.VAR_ROAD_ID]  # road ID tells inserted vehicles from pending ones
+NUMPY_PAIR_SCAN_MIN = 16  # below this many vehicles the plain pair loop beats NumPy's setup cost
 
 stopped_vehicles = set()
 reported_collisions = set()
@@ -64,16 +75,14 @@ for vid, route in ambulance_parking_routes.items():
     # Add vehicle on parking route
     traci.vehicle.add(vid, routeID=route, typeID="ambulance", depart=0)
 
-    # Set all emergency and gap parameters to avoid movement
+    # Hold the ambulance still (minGap / tau / emergencyDecel come from the vTypes in vehicles.rou.xml)
     traci.vehicle.setSpeed(vid, 0)
-    traci.vehicle.setEmergencyDecel(vid, 1000)
-    traci.vehicle.setTau(vid, 0)
-    traci.vehicle.setMinGap(vid, 0)
 
     # Stop vehicle permanently at the start of the parking edge
     parking_edge = traci.route.getEdges(route)[0]
     traci.vehicle.setStop(vid, edgeID=parking_edge, pos=0, duration=1e6)
 
+    traci.vehicle.subscribe(vid, SUBSCRIBED_VARS)
     stopped_vehicles.add(vid)
     print(f"Ambulance {vid} spawned on parking route {route} ({parking_edge})")
 
@@ -87,16 +96,27 @@ def spawn_vehicle(step):
     r = random.choice(routes)
     t = random.choice([v for v in vtypes.keys() if v != "ambulance"])
     traci.vehicle.add(vid, routeID=r, typeID=t, depart=step)
-    traci.vehicle.setEmergencyDecel(vid, 1000)
-    traci.vehicle.setTau(vid, 0)
-    traci.vehicle.setMinGap(vid, 0)
 
     # Random speed
     max_speed = float(vtypes[t].attrib.get("maxSpeed", 13.9))
     speed = random.uniform(max_speed * 0.3, max_speed)
     traci.vehicle.setSpeed(vid, speed)
+    traci.vehicle.subscribe(vid, SUBSCRIBED_VARS)
 
-    print(f"Spawned {vid} on {r} as {t} at speed {speed:.1f} m/s at step {step}")
+    log.debug("Spawned %s on %s as %s at speed %.1f m/s at step %d", vid, r, t, speed, step)
+
+# ----------------------------
+# Pairs of vehicles closer than COLLISION_DISTANCE, each unordered pair once
+def find_close_pairs(positions):
+    if len(positions) < NUMPY_PAIR_SCAN_MIN:
+        return [(v1, v2) for (v1, p1), (v2, p2) in combinations(positions.items(), 2)
+                if (p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2 < COLLISION_DISTANCE_SQ]
+
+    # All pairwise squared distances at once, upper triangle = each pair once
+    vehicles = list(positions)
+    P = np.array([positions[vid] for vid in vehicles], dtype=float)
+    d2 = ((P[:, None, :] - P[None, :, :]) ** 2).sum(axis=-1)
+    return [(vehicles[i], vehicles[j]) for i, j in np.argwhere(np.triu(d2 < COLLISION_DISTANCE_SQ, k=1)).tolist()]
 
 # ----------------------------
 # Spawn initial vehicles
@@ -110,36 +130,36 @@ MAX_STEPS = 500  # or infinite loop if desired
 while step < MAX_STEPS:
     traci.simulationStep()
     step += 1
-    time.sleep(0.5)
+    pace_step()
 
     # Spawn new vehicles periodically
     if step % SPAWN_INTERVAL == 0:
         for _ in range(random.randint(1, 2)):
             spawn_vehicle(step)
 
-    # Get positions of all vehicles
-    vehicles = traci.vehicle.getIDList()
-    positions = {vid: traci.vehicle.getPosition(vid) for vid in vehicles}
+    # Get positions of all vehicles (one subscription fetch instead of a getPosition per vehicle)
+    subs = traci.vehicle.getAllSubscriptionResults()
+    # Vehicles subscribe at add() time; ones still waiting for insertion report an empty road ID
+    # and an invalid position, so they are left out (same membership as getIDList())
+    positions = {vid: res[tc.VAR_POSITION] for vid, res in subs.items() if res.get(tc.VAR_ROAD_ID)}
 
     # Check collisions
-    for vid1, pos1 in positions.items():
-        for vid2, pos2 in positions.items():
-            if vid1 >= vid2:
-                continue
-            distance = math.hypot(pos1[0] - pos2[0], pos1[1] - pos2[1])
-            pair = tuple(sorted([vid1, vid2]))
-            if distance < COLLISION_DISTANCE and pair not in reported_collisions:
-                # Stop involved vehicles permanently
-                for v in pair:
-                    traci.vehicle.setSpeed(v, 0)
-                    stopped_vehicles.add(v)
-
-                x, y = pos1
-                sim_time = traci.simulation.getTime()
-                print(f"⚠️ Accident detected between {vid1} and {vid2} "
-                      f"at location=({x:.2f}, {y:.2f}), time={sim_time:.1f}s")
-
-                reported_collisions.add(pair)
+    for v1, v2 in find_close_pairs(positions):
+        pair = tuple(sorted((v1, v2)))
+        if pair in reported_collisions:
+            continue
+        vid1, vid2 = pair
+        # Stop involved vehicles permanently
+        for v in pair:
+            traci.vehicle.setSpeed(v, 0)
+            stopped_vehicles.add(v)
+
+        x, y = positions[vid1]
+        sim_time = traci.simulation.getTime()
+        log.info("⚠️ Accident detected between %s and %s at location=(%.2f, %.2f), time=%.1fs",
+                 vid1, vid2, x, y, sim_time)
+
+        reported_collisions.add(pair)
 
 # ----------------------------
 traci.close()
@@ -1,7 +1,10 @@
 import random
-import math
-import traci
-from congestion import get_fuzzy_congestion
+import logging
+import numpy as np
+from sumo_backend import traci
+from congestion import get_step_congestion
+
+log = logging.getLogger("sim.erv")
 
 # -------------------- GA Parameters --------------------
 POP_SIZE = 20
@@ -9,6 +12,7 @@ GENERATIONS = 30
 TOURNAMENT_K = 3
 CROSSOVER_RATE = 0.8
 MUTATION_RATE = 0.1
+USE_GA = False  # candidate set is tiny, so exhaustive argmax is exact; GA kept for comparison runs
 
 # -------------------- Ambulance Data --------------------
 ambulance_readiness = {
@@ -17,6 +21,8 @@ ambulance_readiness = {
     "ambulance2": 90
 }
 
+AMBULANCE_IDS = tuple(ambulance_readiness)
+
 ambulance_routes = {
     "ambulance0": "routeAmbulance0",  # A_B_parking
     "ambulance1": "routeAmbulance1",  # D_G_parking
@@ -32,38 +38,50 @@ ambulance_anchor_edges = {
 # =======================================================
 # FITNESS FUNCTION
 # =======================================================
-def fitness(individual, accident_x, accident_y, positions, accident_edge=None):
-    """Fitness = readiness - distance penalty - congestion penalty + edge bonus"""
-    if individual not in positions:
-        return -9999.0
-
-    (x, y) = positions[individual]
-    dist = math.sqrt((x - accident_x) ** 2 + (y - accident_y) ** 2)
-    readiness = ambulance_readiness.get(individual, 50)
-
-    # --- Congestion penalty ---
+def ambulance_congestion(individual, road_ids=None, sim_time=None):
     try:
-        edge_id = traci.vehicle.getRoadID(individual)
-        congestion_val = get_fuzzy_congestion(edge_id)
+        if road_ids is not None and individual in road_ids:
+            edge_id = road_ids[individual]
+        else:
+            edge_id = traci.vehicle.getRoadID(individual)
+        return get_step_congestion(edge_id, sim_time)
     except Exception:
-        congestion_val = 5.0
-
-    # Normalize
-    readiness_norm = readiness / 100.0
-    distance_penalty = dist / 200.0
-    congestion_penalty = congestion_val / 10.0
-
-    # --- Accident edge bonus ---
-    edge_bonus = 0.0
-    if accident_edge:
-        anchor_edge = ambulance_anchor_edges.get(individual)
-        if anchor_edge == accident_edge:
-            edge_bonus = 1.0
-        elif (anchor_edge[0] == accident_edge[0]) or (anchor_edge[-1] == accident_edge[-1]):
-            edge_bonus = 0.5
-
-    score = readiness_norm - distance_penalty - congestion_penalty + edge_bonus
-    return score
+        return 5.0
+
+def accident_edge_bonus(individual, accident_edge):
+    if not accident_edge:
+        return 0.0
+    anchor_edge = ambulance_anchor_edges.get(individual)
+    if anchor_edge == accident_edge:
+        return 1.0
+    if (anchor_edge[0] == accident_edge[0]) or (anchor_edge[-1] == accident_edge[-1]):
+        return 0.5
+    return 0.0
+
+def fitness_batch(ids, accident_x, accident_y, positions, accident_edge=None, road_ids=None, sim_time=None):
+    """
+    Vectorized fitness over a sequence of ambulance IDs, returns an np.ndarray of scores.
+    Fitness = readiness - distance penalty - congestion penalty + edge bonus
+    """
+    ids = list(ids)
+    scores = np.full(len(ids), -9999.0)
+    known = np.fromiter((amb in positions for amb in ids), dtype=bool, count=len(ids))
+    if not known.any():
+        return scores
+
+    live = [amb for amb in ids if amb in positions]
+    pos = np.array([positions[amb] for amb in live], dtype=float)
+    ready = np.array([ambulance_readiness.get(amb, 50) for amb in live], dtype=float)
+    dist = np.hypot(pos[:, 0] - accident_x, pos[:, 1] - accident_y)
+    congestion_val = np.fromiter((ambulance_congestion(amb, road_ids, sim_time) for amb in live), dtype=float, count=len(live))
+    edge_bonus = np.fromiter((accident_edge_bonus(amb, accident_edge) for amb in live), dtype=float, count=len(live))
+
+    scores[known] = ready / 100.0 - dist / 200.0 - congestion_val / 10.0 + edge_bonus
+    return scores
+
+def fitness(individual, accident_x, accident_y, positions, accident_edge=None, road_ids=None, sim_time=None):
+    """Single-candidate fitness, same formula as fitness_batch"""
+    return float(fitness_batch((individual,), accident_x, accident_y, positions, accident_edge, road_ids, sim_time)[0])
 
 # =======================================================
 # SELECTION / CROSSOVER / MUTATION
@@ -83,18 +101,16 @@ def crossover(parent1, parent2):
 
 def mutate(individual):
     if random.random() < MUTATION_RATE:
-        return random.choice(list(ambulance_readiness.keys()))
+        return random.choice(AMBULANCE_IDS)
     return individual
 
 # =======================================================
 # GA DRIVER
 # =======================================================
-def select_best_ambulance(accident_x, accident_y, positions, accident_edge):
-    population = [random.choice(list(ambulance_readiness.keys())) for _ in range(POP_SIZE)]
+def run_ga(fitnesses):
+    population = random.choices(AMBULANCE_IDS, k=POP_SIZE)
 
     for _ in range(GENERATIONS):
-        fitnesses = {ind: fitness(ind, accident_x, accident_y, positions, accident_edge)
-                     for ind in population}
         new_population = []
         while len(new_population) < POP_SIZE:
             p1 = tournament_selection(population, fitnesses)
@@ -104,34 +120,56 @@ def select_best_ambulance(accident_x, accident_y, positions, accident_edge):
             new_population.append(child)
         population = new_population
 
-    final_fitnesses = {ind: fitness(ind, accident_x, accident_y, positions, accident_edge)
-                       for ind in population}
-    best = max(final_fitnesses, key=final_fitnesses.get)
-    print(f"Selected Best Ambulance: {best} (Route: {ambulance_routes[best]})")
+    return max(set(population), key=fitnesses.get)
+
+def select_best_ambulance(accident_x, accident_y, positions, accident_edge, road_ids=None, sim_time=None):
+    # Inputs are fixed for the whole selection, so score each candidate once.
+    # Congestion is memoized per sim_time, so accidents in the same step share edge evaluations
+    if sim_time is None:
+        sim_time = traci.simulation.getTime()
+    ids = AMBULANCE_IDS
+    scores = fitness_batch(ids, accident_x, accident_y, positions, accident_edge, road_ids, sim_time)
+    fitnesses = dict(zip(ids, scores.tolist()))
+
+    if USE_GA:
+        best = run_ga(fitnesses)
+    else:
+        best = max(fitnesses, key=fitnesses.get)
+    log.info("Selected Best Ambulance: %s (Route: %s)", best, ambulance_routes[best])
     return best
 
 # =======================================================
 # ACCIDENT HANDLING
 # =======================================================
-def detect_accident(veh1, veh2, accident_x, accident_y):
-    try:
-        accident_edge = traci.vehicle.getRoadID(veh1)
-    except Exception:
-        accident_edge = None
+def detect_accident(veh1, veh2, accident_x, accident_y, road_ids=None):
+    if road_ids is not None and veh1 in road_ids:
+        accident_edge = road_ids[veh1]
+    else:
+        try:
+            accident_edge = traci.vehicle.getRoadID(veh1)
+        except Exception:
+            accident_edge = None
 
-    print("ACCIDENT DETECTED")
-    print("=========================")
-    print(f"Accident Location: ({accident_x:.2f}, {accident_y:.2f})")
-    print(f"Vehicles involved: {veh1}, {veh2}")
-    print(f"Accident Edge: {accident_edge}")
+    if log.isEnabledFor(logging.INFO):
+        log.info("ACCIDENT DETECTED\n=========================\n"
+                 "Accident Location: (%.2f, %.2f)\nVehicles involved: %s, %s\nAccident Edge: %s",
+                 accident_x, accident_y, veh1, veh2, accident_edge)
     return accident_edge
 
-def handle_accident(veh1, veh2, accident_x, accident_y):
-    accident_edge = detect_accident(veh1, veh2, accident_x, accident_y)
+def handle_accident(veh1, veh2, accident_x, accident_y, vehicle_positions=None, road_ids=None):
+    """
+    vehicle_positions / road_ids: optional per-step {vid: value} snapshots from TraCI
+    subscriptions; when given, no per-vehicle getters are issued for subscribed IDs.
+    """
+    accident_edge = detect_accident(veh1, veh2, accident_x, accident_y, road_ids)
 
     # Collect ambulance positions
     positions = {}
     for amb in ambulance_readiness.keys():
+        if vehicle_positions is not None:
+            if amb in vehicle_positions:
+                positions[amb] = vehicle_positions[amb]
+            continue
         try:
             pos = traci.vehicle.getPosition(amb)
             positions[amb] = pos
@@ -139,24 +177,25 @@ def handle_accident(veh1, veh2, accident_x, accident_y):
             continue
 
     # GA Selection
-    best_ambulance = select_best_ambulance(accident_x, accident_y, positions, accident_edge)
+    best_ambulance = select_best_ambulance(accident_x, accident_y, positions, accident_edge, road_ids)
 
     # Deploy ambulance
     try:
-        if best_ambulance not in traci.vehicle.getIDList():
+        active = vehicle_positions if vehicle_positions is not None else traci.vehicle.getIDList()
+        if best_ambulance not in active:
             traci.vehicle.add(best_ambulance,
                               routeID=ambulance_routes[best_ambulance],
                               typeID="ambulance")
-            print(f"🚑 Spawned {best_ambulance} on {ambulance_routes[best_ambulance]}")
+            log.info("🚑 Spawned %s on %s", best_ambulance, ambulance_routes[best_ambulance])
         else:
-            print(f"🚑 {best_ambulance} already active in simulation.")
+            log.info("🚑 %s already active in simulation.", best_ambulance)
 
         # Reroute ambulance to accident edge
         if accident_edge:
             traci.vehicle.setRoute(best_ambulance, [accident_edge])
-            print(f" {best_ambulance} rerouted to accident edge {accident_edge}")
+            log.info(" %s rerouted to accident edge %s", best_ambulance, accident_edge)
 
     except Exception as e:
-        print(f"Failed to deploy {best_ambulance}: {e}")
+        log.warning("Failed to deploy %s: %s", best_ambulance, e)
 
     return best_ambulance
@@ -1,13 +1,24 @@
 import time
-import traci
+from sumo_backend import traci
 import math
+import numpy as np
 
 class CENBroadcast:
     def __init__(self, interval=5, edge_nodes=None):
         self.interval = interval
         self.accidents = {}
+        # Append-only list of registered accident IDs; listeners keep a cursor into it to pick up new ones.
+        # Broadcast timers are a parallel array (row i <-> accident_log[i]) so the due check is one vectorized compare
+        self.accident_log = []
+        self._acc_index = {}
+        self._last_time = np.empty(16)
         self.edge_nodes = edge_nodes if edge_nodes else {}
 
+        # Edge node positions are fixed, cache them as an (N, 2) array
+        self._edge_ids = list(self.edge_nodes)
+        self._edge_xy = np.array([info['position'] for info in self.edge_nodes.values()], dtype=float).reshape(-1, 2)
+        self._edge_positions = {k: v['position'] for k, v in self.edge_nodes.items()}
+
         self.edgecen_names = {
             "EdgeNode_A": "EdgeCEN_A",
             "EdgeNode_D": "EdgeCEN_D",
@@ -16,72 +27,110 @@ class CENBroadcast:
         }
 
     def get_nearest_edge_node(self, position):
-        x, y = position
-        min_dist = float('inf')
-        nearest_edge = None
-        for edge_id, info in self.edge_nodes.items():
-            node_x, node_y = info['position']
-            dist = math.hypot(x - node_x, y - node_y)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_edge = edge_id
-        return nearest_edge
+        if not self._edge_ids:
+            return None
+        # Squared distance keeps the same argmin without the sqrt
+        d2 = ((self._edge_xy - np.asarray(position, dtype=float)) ** 2).sum(axis=1)
+        return self._edge_ids[int(d2.argmin())]
+
+    def vehicles_in_range(self, vehicles_dict, skip, cen_pos, comm_range, vehicle_positions=None):
+        """Return IDs of vehicles within comm_range of cen_pos using one vectorized distance test"""
+        ids = []
+        coords = []
+        for vid in vehicles_dict:
+            if vid in skip:
+                continue  # skip vehicles involved in the accident
+            if vehicle_positions is not None:
+                # The snapshot lists every live vehicle, anything missing has left the simulation
+                if vid in vehicle_positions:
+                    ids.append(vid)
+                    coords.append(vehicle_positions[vid])
+                continue
+            try:
+                coords.append(traci.vehicle.getPosition(vid))
+                ids.append(vid)
+            except traci.TraCIException:
+                continue
+        if not ids:
+            return []
+
+        pos = np.array(coords, dtype=float)
+        in_range = ((pos - cen_pos) ** 2).sum(axis=1) <= comm_range ** 2
+        return [ids[i] for i in np.flatnonzero(in_range)]
 
-    def register(self, accident_id, location, sim_time, vehicles_involved):
+    def register(self, accident_id, location, sim_time, vehicles_involved, accident_edge=None, edge_blocked=False):
         """
         Register a new accident with the nearest CEN.
         vehicles_involved: list of vehicle IDs involved in this accident
+        accident_edge: SUMO edge the accident happened on (None if unknown)
+        edge_blocked: True if the caller raised the edge's travel time so SUMO's router avoids it
         """
         registering_edge = self.get_nearest_edge_node(location)
         registering_name = self.edgecen_names.get(registering_edge, registering_edge)
 
+        idx = self._acc_index.get(accident_id)
+        if idx is None:
+            idx = len(self.accident_log)
+            if idx == len(self._last_time):
+                self._last_time = np.concatenate([self._last_time, np.empty(len(self._last_time))])  # geometric growth
+            self.accident_log.append(accident_id)
+            self._acc_index[accident_id] = idx
+        self._last_time[idx] = sim_time
+
         self.accidents[accident_id] = {
             "location": location,
-            "last_time": sim_time,
             "registered_by_edge": registering_edge,
             "registered_by_name": registering_name,
-            "vehicles_involved": set(vehicles_involved)  # store as set for fast lookup
+            "vehicles_involved": frozenset(vehicles_involved),  # immutable set for fast lookup
+            "accident_edge": accident_edge,
+            "edge_blocked": edge_blocked
         }
 
         print(f"[CEN {registering_name} REGISTER] Accident {accident_id} at {location} involving vehicles {vehicles_involved} (sim time {sim_time:.1f}s)")
 
-    def broadcast(self, sim_time, vehicles_dict, graph, comm_range=None):
-        """Broadcast accident info to nearby edge nodes and vehicles"""
-        for acc_id, data in self.accidents.items():
-            if sim_time - data["last_time"] >= self.interval:
-                broadcasting_name = data['registered_by_name']
-                broadcasting_edge = data['registered_by_edge']
+    def broadcast(self, sim_time, vehicles_dict, graph, comm_range=None, vehicle_positions=None):
+        """
+        Broadcast accident info to nearby edge nodes and vehicles.
+        vehicle_positions: optional {vid: (x, y)} snapshot from TraCI subscriptions
+        """
+        n = len(self.accident_log)
+        if not n:
+            return
+        due = np.flatnonzero(sim_time - self._last_time[:n] >= self.interval)
+        for i in due.tolist():
+            acc_id = self.accident_log[i]
+            data = self.accidents[acc_id]
+            broadcasting_name = data['registered_by_name']
+            broadcasting_edge = data['registered_by_edge']
 
-                print(f"[CEN {broadcasting_name} BROADCAST] Accident {acc_id} at {data['location']} being broadcast at sim time {sim_time:.1f}s")
+            print(f"[CEN {broadcasting_name} BROADCAST] Accident {acc_id} at {data['location']} being broadcast at sim time {sim_time:.1f}s")
 
-                # --- Notify edge nodes ---
-                if self.edge_nodes:
-                    for edge_id, edge_info in self.edge_nodes.items():
-                        edge_pos = edge_info['position']
-                        distance = math.hypot(edge_pos[0] - data['location'][0], edge_pos[1] - data['location'][1])
-                        if distance <= comm_range:
-                            receiver_name = self.edgecen_names.get(edge_id, edge_id)
-                            print(f"    [CEN {receiver_name} RECEIVED] Accident {acc_id} info received from {broadcasting_name} (distance: {distance:.1f})")
+            # --- Notify edge nodes ---
+            if self.edge_nodes:
+                acc_x, acc_y = data['location']
+                comm_r2 = comm_range ** 2
+                for edge_id, edge_info in self.edge_nodes.items():
+                    edge_pos = edge_info['position']
+                    d2 = (edge_pos[0] - acc_x) ** 2 + (edge_pos[1] - acc_y) ** 2
+                    if d2 <= comm_r2:
+                        distance = math.sqrt(d2)
+                        receiver_name = self.edgecen_names.get(edge_id, edge_id)
+                        print(f"    [CEN {receiver_name} RECEIVED] Accident {acc_id} info received from {broadcasting_name} (distance: {distance:.1f})")
 
-                # --- Notify vehicles in range (skip involved vehicles) ---
-                if vehicles_dict and self.edge_nodes:
-                    positions_dict = {k: v['position'] for k, v in self.edge_nodes.items()}
-                    for vid, vehicle in vehicles_dict.items():
-                        if vid in data['vehicles_involved']:
-                            continue  # skip vehicles involved in the accident
-                        try:
-                            veh_pos = traci.vehicle.getPosition(vid)
-                            cen_pos = self.edge_nodes[broadcasting_edge]['position']
-                            dist = math.hypot(veh_pos[0] - cen_pos[0], veh_pos[1] - cen_pos[1])
-                            if dist <= comm_range:
-                                vehicle.listen_and_reroute(
-                                    cen=self,
-                                    cen_positions=positions_dict,
-                                    graph=graph,
-                                    accident_edge=acc_id,  # you can pass accident_id or edge if needed
-                                    comm_range=comm_range
-                                )
-                        except:
-                            continue
+            # --- Notify vehicles in range (skip involved vehicles) ---
+            if vehicles_dict and self.edge_nodes:
+                cen_pos = np.asarray(self.edge_nodes[broadcasting_edge]['position'], dtype=float)
+                for vid in self.vehicles_in_range(vehicles_dict, data['vehicles_involved'],
+                                                  cen_pos, comm_range, vehicle_positions):
+                    try:
+                        vehicles_dict[vid].listen_and_reroute(
+                            cen=self,
+                            cen_positions=self._edge_positions,
+                            graph=graph,
+                            accident_edge=acc_id,  # you can pass accident_id or edge if needed
+                            comm_range=comm_range
+                        )
+                    except:
+                        continue
 
-                data["last_time"] = sim_time
+        self._last_time[due] = sim_time
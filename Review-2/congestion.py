@@ -1,7 +1,7 @@
 import os
 import sys
 import time
-import traci
+from sumo_backend import traci
 import numpy as np
 import skfuzzy as fuzz
 from skfuzzy import control as ctrl
@@ -48,3 +48,20 @@ def get_fuzzy_congestion(edge):
     congestion_sim.input['avg_speed'] = avg_spd
     congestion_sim.compute()
     return congestion_sim.output['congestion']  # 0-10
+
+# -------------------- Per-step Cache --------------------
+# Edge state only changes when SUMO advances, so each edge is evaluated at most once per sim time
+_cache_time = None
+_congestion_cache = {}
+
+def get_step_congestion(edge, sim_time=None):
+    global _cache_time
+    if sim_time is None:
+        return get_fuzzy_congestion(edge)
+    if sim_time != _cache_time:
+        _congestion_cache.clear()
+        _cache_time = sim_time
+    value = _congestion_cache.get(edge)
+    if value is None:
+        value = _congestion_cache[edge] = get_fuzzy_congestion(edge)
+    return value
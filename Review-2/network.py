@@ -0,0 +1,35 @@
+"""
+
+Static road network topology (nodes A–I) shared by the route generator
+and the simulation.
+
+The graph is fixed at build time (see edges.xml), so consumers read
+neighbours from these dicts instead of querying SUMO at runtime.
+
+"""
+
+# Define nodes in the road network (graph representation)
+nodes = ["A","B","C","D","E","F","G","H","I"]
+
+# Define edges (connections) between nodes
+edges = {
+    "A": ["B", "D"],
+    "B": ["A", "C", "E"],
+    "C": ["B", "F"],
+    "D": ["A", "E", "G"],
+    "E": ["B", "D", "F", "H"],
+    "F": ["C", "E", "I"],
+    "G": ["D", "H"],
+    "H": ["G", "E", "I"],
+    "I": ["F", "H"]
+}
+
+# Boundary nodes (routes should end when reaching these)
+boundary_nodes = ["A", "B", "C", "D", "F", "G", "H", "I"]
+
+# Every road segment in edges.xml has the same length
+EDGE_WEIGHT = 100
+
+# Weighted adjacency used for rerouting: node -> [(neighbour, cost), ...]
+graph = {node: [(neighbor, EDGE_WEIGHT) for neighbor in neighbors]
+         for node, neighbors in edges.items()}
@@ -1,15 +1,20 @@
 import sys
 import os
-import time
 import random
 import xml.etree.ElementTree as ET
-import math
-import uuid
-from collections import defaultdict
+import itertools
+import logging
+import logging.handlers
+import queue
+import atexit
+from collections import defaultdict, namedtuple, deque
+import numpy as np
+from scipy.spatial import cKDTree
 from cen_broadcast import CENBroadcast
 from vehicle import Vehicle
-import traci
-import sumolib
+from network import graph
+from sumo_backend import traci, SUMO_BINARY, pace_step
+from traci import constants as tc
 
 # -------------------- SUMO PATH SETUP --------------------
 if 'SUMO_HOME' not in os.environ:
@@ -19,13 +24,36 @@ tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
 if tools not in sys.path:
     sys.path.append(tools)
 from best_erv import select_best_ambulance
+# -------------------- LOGGING --------------------
+# SIM_LOG_LEVEL (default INFO, same as accident.py) controls the "sim" logger and its children.
+# INFO shows V2I receive, reroute and ERV selection lines; DEBUG adds V2V relay chatter;
+# WARNING keeps only failures. Records are queued on the sim thread and written to stderr
+# by a background listener
+log = logging.getLogger("sim")
+log.setLevel(os.environ.get("SIM_LOG_LEVEL", "INFO"))
+log.propagate = False
+_log_queue = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # flush whatever is still queued on exit
+
 # -------------------- SUMO SETUP --------------------
-sumoBinary = sumolib.checkBinary("sumo-gui")
+sumoBinary = SUMO_BINARY  # sumo or sumo-gui, chosen in sumo_backend (--headless / USE_LIBSUMO)
 sumoConfig = "simulation.sumocfg"
 vehicles_dict = {}
 V2V_COMMUNICATION_RANGE = 200.0
-MAX_HOP_COUNT = 5
+MAX_HOP_COUNT = 5  # max V2V relay levels; each relay adds exactly one hop
+MAX_HISTORY_PER_MSG = 32
+V2V_REBROADCAST_FANOUT = 3  # only the farthest receivers per hop relay further (broadcast-storm control)
 COLLISION_DISTANCE = 7.5
+BLOCKED_TRAVEL_TIME = 1e9  # travel time assigned to an accident edge so SUMO's router avoids it
+# Range tests compare squared distances, sqrt is only taken for values that get reported
+V2V_R2 = V2V_COMMUNICATION_RANGE ** 2
+COLL_R2 = COLLISION_DISTANCE ** 2
+SUBSCRIBED_VARS = [tc.VAR_POSITION, tc.VAR_ROAD_ID, tc.VAR_LANEPOSITION, tc.VAR_EDGES]
 
 # Edge node positions (fixed infrastructure nodes)
 EDGE_NODE_POSITIONS = {
@@ -37,18 +65,29 @@ EDGE_NODE_POSITIONS = {
 
 # Global state
 edge_nodes = {}
+EDGE_NODE_IDS = list(EDGE_NODE_POSITIONS)
+EDGE_NODE_XY = np.array(list(EDGE_NODE_POSITIONS.values()), dtype=float)
 broadcasted_accidents = set()
-message_history = {}
+# message_id -> most recent (vehicle_id, hop_count, relayed_from) relays, bounded per message
+message_history = defaultdict(lambda: deque(maxlen=MAX_HISTORY_PER_MSG))
 hop_count_stats = defaultdict(int)
 reported_collisions = set()
 total_accidents = 0
 successful_notifications = 0
+MSG_COUNTER = itertools.count()  # per-run message IDs, no need for uuid4's urandom syscall
+
+# Per-step snapshot of subscribed vehicle state, built once after each simulationStep.
+# vehicle_ids / vehicle_xy hold the non-ambulance vehicles as parallel arrays (row i <-> vehicle_ids[i]),
+# vehicle_tree indexes vehicle_xy and is shared by collision detection and V2V neighbour queries
+StepCache = namedtuple('StepCache', ['ids', 'positions', 'road_ids', 'lane_positions', 'routes', 'sim_time',
+                                     'vehicle_ids', 'vehicle_xy', 'vehicle_tree'])
 
 # -------------------- PARSE ROUTES AND VEHICLE TYPES --------------------
 rou_file = "vehicles.rou.xml"
 tree = ET.parse(rou_file)
 root = tree.getroot()
 routes = [r.attrib['id'] for r in root.findall("route") if not r.attrib['id'].startswith('routeAmbulance')]
+route_edges = {r.attrib['id']: r.attrib['edges'].split() for r in root.findall("route")}
 vtypes = {v.attrib['id']: v for v in root.findall("vType") if v.attrib['id'] != 'ambulance'}
 
 print("Loaded routes:", len(routes))
@@ -60,6 +99,9 @@ VEHICLE_COUNTER = 0
 
 # -------------------- V2V MESSAGE CLASS --------------------
 class V2VMessage:
+    __slots__ = ('message_id', 'source_id', 'message_type', 'payload', 'origin_location',
+                 'hop_count', 'propagation_path', 'timestamp', 'reached_edge_node')
+
     def __init__(self, message_id, source_id, message_type, payload, origin_location):
         self.message_id = message_id
         self.source_id = source_id
@@ -71,10 +113,6 @@ class V2VMessage:
         self.timestamp = traci.simulation.getTime()
         self.reached_edge_node = False
 
-    def increment_hop(self, next_node):
-        self.hop_count += 1
-        self.propagation_path.append(next_node)
-
 # -------------------- INITIALIZE EDGE NODES --------------------
 def initialize_edge_nodes():
     print("EDGE NODE INITIALIZATION")
@@ -93,114 +131,164 @@ def initialize_edge_nodes():
 
 # -------------------- HELPER FUNCTIONS --------------------
 # -------------------- HELPER FUNCTIONS WITH LOGGING --------------------
-def get_vehicle_position(vehicle_id):
+def build_step_cache():
+    # Vehicles are subscribed right after add(), so results also hold vehicles still waiting for
+    # insertion (invalid position, empty road ID). Keep only vehicles actually in the network.
+    results = {vid: res for vid, res in traci.vehicle.getAllSubscriptionResults().items()
+               if res.get(tc.VAR_ROAD_ID)}
+    vehicle_ids = [vid for vid in results if not vid.startswith('ambulance')]
+    vehicle_xy = np.array([results[vid][tc.VAR_POSITION] for vid in vehicle_ids], dtype=float).reshape(-1, 2)
+    return StepCache(
+        ids=frozenset(results),
+        positions={vid: res[tc.VAR_POSITION] for vid, res in results.items()},
+        road_ids={vid: res[tc.VAR_ROAD_ID] for vid, res in results.items()},
+        lane_positions={vid: res[tc.VAR_LANEPOSITION] for vid, res in results.items()},
+        routes={vid: res[tc.VAR_EDGES] for vid, res in results.items()},
+        sim_time=traci.simulation.getTime(),
+        vehicle_ids=vehicle_ids,
+        vehicle_xy=vehicle_xy,
+        vehicle_tree=cKDTree(vehicle_xy) if vehicle_ids else None
+    )
+
+def get_vehicle_position(vehicle_id, cache=None):
+    if cache is not None:
+        return cache.positions.get(vehicle_id)
+    # Without a step cache, let TraCI reject unknown IDs instead of fetching the whole ID list
     try:
-        if vehicle_id in traci.vehicle.getIDList():
-            return traci.vehicle.getPosition(vehicle_id)
-    except:
-        pass
-    return None
-
-def calculate_distance(pos1, pos2):
-    if pos1 and pos2:
-        return math.hypot(pos1[0] - pos2[0], pos1[1] - pos2[1])
-    return float('inf')
-
-def find_vehicles_in_range(source_position, exclude_vehicle=None):
-    vehicles_in_range = []
-    for vehicle_id in traci.vehicle.getIDList():
-        if vehicle_id == exclude_vehicle or vehicle_id.startswith('ambulance'):
-            continue
-        vehicle_pos = get_vehicle_position(vehicle_id)
-        if vehicle_pos:
-            distance = calculate_distance(source_position, vehicle_pos)
-            if distance <= V2V_COMMUNICATION_RANGE:
-                vehicles_in_range.append((vehicle_id, distance, vehicle_pos))
-    vehicles_in_range.sort(key=lambda x: x[1])
-    if vehicles_in_range:
-        print(f"    Vehicles in range of {exclude_vehicle}: {[v[0] for v in vehicles_in_range]}")
+        return traci.vehicle.getPosition(vehicle_id)
+    except traci.TraCIException:
+        return None
+
+def find_collision_pairs(cache):
+    """Return sorted vehicle ID pairs closer than COLLISION_DISTANCE, using the step's KD-tree"""
+    ids = cache.vehicle_ids
+    if len(ids) < 2:
+        return []
+    xy = cache.vehicle_xy
+    candidates = cache.vehicle_tree.query_pairs(COLLISION_DISTANCE, output_type='ndarray')
+    if len(candidates) == 0:
+        return []
+    # query_pairs is inclusive, keep the strict threshold (vectorized over all candidates)
+    d2 = ((xy[candidates[:, 0]] - xy[candidates[:, 1]]) ** 2).sum(axis=1)
+    hits = candidates[d2 < COLL_R2]
+    return sorted(tuple(sorted((ids[i], ids[j]))) for i, j in hits.tolist())
+
+def detect_accident(veh1, veh2, x, y, cache):
+    """Dummy implementation: returns the current edge of veh1 (from the step cache) as the accident edge."""
+    return cache.road_ids.get(veh1)
+
+def _in_range(src_xy, pts_xy, r2):
+    """Indices of rows in pts_xy within sqrt(r2) of src_xy (nearest first) and their distances"""
+    d2 = ((pts_xy - src_xy) ** 2).sum(axis=1)
+    idx = np.flatnonzero(d2 <= r2)
+    idx = idx[np.argsort(d2[idx], kind='stable')]
+    return idx, np.sqrt(d2[idx])
+
+# Hot helpers bind module constants as default args (LOAD_FAST instead of LOAD_GLOBAL)
+def find_vehicles_in_range(source_position, cache, exclude_vehicle=None, _r=V2V_COMMUNICATION_RANGE):
+    if cache.vehicle_tree is None:
+        return []
+    src = np.asarray(source_position, dtype=float)
+    # Tree narrows the candidates, exact distances are only computed for those
+    cand = np.asarray(cache.vehicle_tree.query_ball_point(src, _r, return_sorted=True), dtype=np.intp)
+    d2 = ((cache.vehicle_xy[cand] - src) ** 2).sum(axis=1)
+    order = np.argsort(d2, kind='stable')
+    idx, dist = cand[order], np.sqrt(d2[order])
+    vehicles_in_range = [(cache.vehicle_ids[i], d, cache.positions[cache.vehicle_ids[i]])
+                         for i, d in zip(idx.tolist(), dist.tolist())
+                         if cache.vehicle_ids[i] != exclude_vehicle]
+    if vehicles_in_range and log.isEnabledFor(logging.DEBUG):
+        log.debug("    Vehicles in range of %s: %s", exclude_vehicle, [v[0] for v in vehicles_in_range])
     return vehicles_in_range
 
-def find_edge_nodes_in_range(position):
-    edge_nodes_in_range = []
-    for edge_id, edge_info in edge_nodes.items():
-        distance = calculate_distance(position, edge_info['position'])
-        if distance <= V2V_COMMUNICATION_RANGE:
-            edge_nodes_in_range.append((edge_id, distance))
-    edge_nodes_in_range.sort(key=lambda x: x[1])
-    if edge_nodes_in_range:
-        print(f"    Edge nodes in range at pos {position}: {[e[0] for e in edge_nodes_in_range]}")
+def find_edge_nodes_in_range(position, _r2=V2V_R2, _xy=EDGE_NODE_XY):
+    # Only a handful of fixed nodes, one vectorized distance test beats a tree query
+    idx, dist = _in_range(np.asarray(position, dtype=float), _xy, _r2)
+    edge_nodes_in_range = [(EDGE_NODE_IDS[i], d) for i, d in zip(idx.tolist(), dist.tolist())]
+    if edge_nodes_in_range and log.isEnabledFor(logging.DEBUG):
+        log.debug("    Edge nodes in range at pos %s: %s", position, [e[0] for e in edge_nodes_in_range])
     return edge_nodes_in_range
 
-def propagate_v2v_message(message, current_vehicle_id, current_position):
-    print(f"    [V2V] Vehicle {current_vehicle_id} propagating message {message.message_id}, hop {message.hop_count}")
-    if message.hop_count >= MAX_HOP_COUNT:
-        print(f"        [V2V] Message {message.message_id} reached max hops ({MAX_HOP_COUNT})")
-        return False
-
-    # Check edge nodes in range
-    edge_nodes_in_range = find_edge_nodes_in_range(current_position)
-    for edge_id, distance in edge_nodes_in_range:
-        if message.message_id not in edge_nodes[edge_id]['message_cache']:
-            edge_nodes[edge_id]['message_cache'].add(message.message_id)
-            edge_nodes[edge_id]['total_messages_received'] += 1
-            if message.message_type == "EMERGENCY":
-                edge_nodes[edge_id]['unique_accidents_reported'].add(message.payload.get('accident_id'))
-                alert_info = {
-                    'accident_id': message.payload.get('accident_id'),
-                    'vehicles_involved': message.payload.get('vehicles_involved', []),
-                    'location': message.payload.get('location'),
-                    'timestamp': message.payload.get('timestamp'),
-                    'received_at': traci.simulation.getTime(),
-                    'hop_count': message.hop_count,
-                    'propagation_path': message.propagation_path.copy()
-                }
-                edge_nodes[edge_id]['accident_alerts_received'].append(alert_info)
-            message.reached_edge_node = True
-            hop_count_stats[message.hop_count] += 1
-            print(f"        [CEN] Edge node {edge_id} received message {message.message_id} about accident {message.payload.get('accident_id')}")
-            return True
-
-    # Propagate to vehicles in range
-    vehicles_in_range = find_vehicles_in_range(current_position, exclude_vehicle=current_vehicle_id)
-    propagation_successful = False
-    for vehicle_id, distance, vehicle_pos in vehicles_in_range:
-        if vehicle_id in message.propagation_path:
+def _reconstruct_path(parents, vehicle_id):
+    path = []
+    while vehicle_id is not None:
+        path.append(vehicle_id)
+        vehicle_id = parents[vehicle_id]
+    path.reverse()
+    return path
+
+def deliver_to_edge_node(message, edge_id, cache):
+    edge_nodes[edge_id]['message_cache'].add(message.message_id)
+    edge_nodes[edge_id]['total_messages_received'] += 1
+    if message.message_type == "EMERGENCY":
+        edge_nodes[edge_id]['unique_accidents_reported'].add(message.payload.get('accident_id'))
+        alert_info = {
+            'accident_id': message.payload.get('accident_id'),
+            'vehicles_involved': message.payload.get('vehicles_involved', []),
+            'location': message.payload.get('location'),
+            'timestamp': message.payload.get('timestamp'),
+            'received_at': cache.sim_time,
+            'hop_count': message.hop_count,
+            'propagation_path': message.propagation_path.copy()
+        }
+        edge_nodes[edge_id]['accident_alerts_received'].append(alert_info)
+    message.reached_edge_node = True
+    hop_count_stats[message.hop_count] += 1
+    log.debug("        [CEN] Edge node %s received message %s about accident %s",
+              edge_id, message.message_id, message.payload.get('accident_id'))
+
+def propagate_v2v_message(message, current_vehicle_id, current_position, cache, _max_hops=MAX_HOP_COUNT,
+                          _fanout=V2V_REBROADCAST_FANOUT):
+    """Breadth-first V2V relay from current_vehicle_id until an edge node is reached"""
+    frontier = deque([(current_vehicle_id, current_position, message.hop_count)])
+    visited = {current_vehicle_id}
+    parents = {current_vehicle_id: None}
+
+    while frontier:
+        vehicle_id, position, hop_count = frontier.popleft()
+        log.debug("    [V2V] Vehicle %s propagating message %s, hop %d", vehicle_id, message.message_id, hop_count)
+        if hop_count >= _max_hops:
+            log.debug("        [V2V] Message %s reached max hops (%d)", message.message_id, _max_hops)
             continue
-        next_message = V2VMessage(
-            message.message_id,
-            vehicle_id,
-            message.message_type,
-            message.payload,
-            message.origin_location
-        )
-        next_message.hop_count = message.hop_count + 1
-        next_message.propagation_path = message.propagation_path.copy()
-        next_message.increment_hop(vehicle_id)
-        if next_message.message_id not in message_history:
-            message_history[next_message.message_id] = []
-        message_history[next_message.message_id].append(next_message)
-        print(f"        [V2V] Vehicle {current_vehicle_id} sending message {message.message_id} to vehicle {vehicle_id}")
-        success = propagate_v2v_message(next_message, vehicle_id, vehicle_pos)
-        if success:
-            propagation_successful = True
-            break
-    return propagation_successful
-
-def broadcast_emergency_alert(source_vehicle_id, accident_location, collision_pair, accident_id):
+
+        # Check edge nodes in range
+        for edge_id, distance in find_edge_nodes_in_range(position):
+            if message.message_id not in edge_nodes[edge_id]['message_cache']:
+                message.hop_count = hop_count
+                message.propagation_path = _reconstruct_path(parents, vehicle_id)
+                deliver_to_edge_node(message, edge_id, cache)
+                return True
+
+        # Every in-range vehicle receives the message, but only the farthest
+        # `_fanout` new receivers (list is sorted nearest first) rebroadcast it
+        receivers = [v for v in find_vehicles_in_range(position, cache, exclude_vehicle=vehicle_id)
+                     if v[0] not in visited]
+        visited.update(v[0] for v in receivers)
+        for next_id, distance, next_pos in receivers[-_fanout:]:
+            parents[next_id] = vehicle_id
+            # The single `message` object is shared by every hop; relays are recorded as
+            # (receiver, hop_count, sender) and the full path is only materialized on delivery
+            message_history[message.message_id].append((next_id, hop_count + 1, vehicle_id))
+            log.debug("        [V2V] Vehicle %s sending message %s to vehicle %s", vehicle_id, message.message_id, next_id)
+            frontier.append((next_id, next_pos, hop_count + 1))
+
+    return False
+
+def broadcast_emergency_alert(source_vehicle_id, accident_location, collision_pair, accident_id, cache):
     global successful_notifications
-    print(f"[ACCIDENT] Accident {accident_id} occurred between vehicles {collision_pair} at location {accident_location}")
-    source_position = get_vehicle_position(source_vehicle_id)
+    log.info("[ACCIDENT] Accident %s occurred between vehicles %s at location %s",
+             accident_id, collision_pair, accident_location)
+    source_position = get_vehicle_position(source_vehicle_id, cache)
     if not source_position:
-        print(f"    [WARNING] Source vehicle {source_vehicle_id} position not found")
+        log.warning("    [WARNING] Source vehicle %s position not found", source_vehicle_id)
         return False
-    message_id = f"EMERGENCY_{uuid.uuid4().hex[:8]}"
+    message_id = f"EMERGENCY_{next(MSG_COUNTER):08x}"
     emergency_payload = {
         'accident_id': accident_id,
         'vehicles_involved': collision_pair,
         'location': accident_location,
         'severity': 'HIGH',
-        'timestamp': traci.simulation.getTime()
+        'timestamp': cache.sim_time
     }
     message = V2VMessage(
         message_id,
@@ -209,13 +297,13 @@ def broadcast_emergency_alert(source_vehicle_id, accident_location, collision_pa
         emergency_payload,
         accident_location
     )
-    message_history[message_id] = [message]
-    success = propagate_v2v_message(message, source_vehicle_id, source_position)
+    message_history[message_id].append((source_vehicle_id, 0, None))
+    success = propagate_v2v_message(message, source_vehicle_id, source_position, cache)
     if success:
         successful_notifications += 1
-        print(f"    [SUCCESS] Emergency alert {message_id} successfully propagated to edge nodes")
+        log.info("    [SUCCESS] Emergency alert %s successfully propagated to edge nodes", message_id)
     else:
-        print(f"    [FAILURE] Emergency alert {message_id} propagation failed")
+        log.warning("    [FAILURE] Emergency alert %s propagation failed", message_id)
     return success
 
 
@@ -228,18 +316,8 @@ traci.start([sumoBinary, "-c", sumoConfig,
 # -------------------- INITIALIZE EDGE NODES --------------------
 initialize_edge_nodes()
 cen = CENBroadcast(interval=10, edge_nodes=edge_nodes)
-
-graph = {
-    "A": [("B", 100), ("D", 100)],
-    "B": [("A", 100), ("C", 100), ("E", 100)],
-    "C": [("B", 100), ("F", 100)],
-    "D": [("A", 100), ("E", 100), ("G", 100)],
-    "E": [("B", 100), ("D", 100), ("F", 100), ("H", 100)],
-    "F": [("C", 100), ("E", 100), ("I", 100)],
-    "G": [("D", 100), ("H", 100)],
-    "H": [("G", 100), ("E", 100), ("I", 100)],
-    "I": [("F", 100), ("H", 100)]
-}
+# Edge node positions never change after initialization
+EDGE_POS_DICT = {k: v['position'] for k, v in edge_nodes.items()}
 
 # -------------------- SPAWN AMBULANCES --------------------
 ambulance_parking_routes = {
@@ -248,19 +326,25 @@ ambulance_parking_routes = {
     "ambulance2": "routeAmbulance2"
 }
 
+# Parking routes are static XML, so resolve edges and lane lengths once
+PARKING_EDGES = {amb_id: route_edges[route][0] for amb_id, route in ambulance_parking_routes.items()}
+LANE_LENGTHS = {}
+for parking_edge in PARKING_EDGES.values():
+    lane_id = parking_edge + "_0"
+    try:
+        LANE_LENGTHS[lane_id] = traci.lane.getLength(lane_id)
+    except Exception as e:
+        print(f"Failed to read lane length for {lane_id}: {e}")
+
 for vid, route in ambulance_parking_routes.items():
     try:
         traci.vehicle.add(vid, routeID=route, typeID="ambulance", depart=0)
         traci.vehicle.setSpeed(vid, 0)
         traci.vehicle.setMaxSpeed(vid, 0)
-        traci.vehicle.setEmergencyDecel(vid, 1000)
-        traci.vehicle.setTau(vid, 0)
-        traci.vehicle.setMinGap(vid, 0)
-        parking_edge = traci.route.getEdges(route)[0]
-        lane_id = parking_edge + "_0"
-        lane_length = traci.lane.getLength(lane_id)
-        pos = lane_length / 2.0
+        parking_edge = PARKING_EDGES[vid]
+        pos = LANE_LENGTHS[parking_edge + "_0"] / 2.0
         traci.vehicle.setStop(vid, edgeID=parking_edge, pos=pos, duration=1e6)
+        traci.vehicle.subscribe(vid, SUBSCRIBED_VARS)
     except Exception as e:
         print(f"Failed to spawn ambulance {vid}: {e}")
 
@@ -278,13 +362,11 @@ def spawn_vehicle(step):
     t = random.choice(list(vtypes.keys()))
     try:
         traci.vehicle.add(vid, routeID=r, typeID=t, depart=step)
-        traci.vehicle.setEmergencyDecel(vid, 1000)
-        traci.vehicle.setTau(vid, 0)
-        traci.vehicle.setMinGap(vid, 0)
         max_speed = float(vtypes[t].attrib.get("maxSpeed", 13.9))
         speed = random.uniform(max_speed*0.3, max_speed)
         traci.vehicle.setSpeed(vid, speed)
-        vehicles_dict[vid] = Vehicle(veh_id=vid, destination=traci.vehicle.getRoute(vid)[-1])
+        traci.vehicle.subscribe(vid, SUBSCRIBED_VARS)
+        vehicles_dict[vid] = Vehicle(veh_id=vid, destination=route_edges[r][-1])
     except Exception as e:
         print(f"Failed to spawn vehicle {vid}: {e}")
 
@@ -298,7 +380,8 @@ MAX_STEPS = 500
 while step < MAX_STEPS:
     traci.simulationStep()
     step += 1
-    time.sleep(0.5)
+    cache = build_step_cache()
+    pace_step()
 
     # Spawn new vehicles
     if step % SPAWN_INTERVAL == 0:
@@ -306,68 +389,58 @@ while step < MAX_STEPS:
             spawn_vehicle(step)
 
     # Track vehicles
-    vehicles = [v for v in traci.vehicle.getIDList() if not v.startswith('ambulance')]
-    positions = {vid: get_vehicle_position(vid) for vid in vehicles}
-
     # Detect new collisions
     new_collisions = []
-    for vid1, pos1 in positions.items():
-        for vid2, pos2 in positions.items():
-            if vid1 >= vid2:
-                continue
-            distance = calculate_distance(pos1, pos2)
-            pair = tuple(sorted([vid1, vid2]))
-            if distance < COLLISION_DISTANCE and pair not in reported_collisions:
-                for v in pair:
-                    try:
-                        traci.vehicle.setSpeed(v, 0)
-                        traci.vehicle.setColor(v, (255,0,0,255))
-                        current_edge = traci.vehicle.getRoadID(v)
-                        current_pos = traci.vehicle.getLanePosition(v)
-                        traci.vehicle.setStop(v, edgeID=current_edge, pos=current_pos, duration=999999)
-                    except:
-                        pass
-                reported_collisions.add(pair)
-                new_collisions.append((pair, pos1))
-                total_accidents += 1
-                print(f"[ACCIDENT] Vehicles involved: {pair} at position {pos1} (Total accidents: {total_accidents})")
+    for pair in find_collision_pairs(cache):
+        if pair in reported_collisions:
+            continue
+        for v in pair:
+            # Pairs come from this step's cache, so edge / lane position lookups are safe
+            traci.vehicle.setSpeed(v, 0)
+            traci.vehicle.setColor(v, (255,0,0,255))
+            try:
+                traci.vehicle.setStop(v, edgeID=cache.road_ids[v], pos=cache.lane_positions[v], duration=999999)
+            except traci.TraCIException:
+                pass  # e.g. stopped on an internal junction edge
+        pos1 = cache.positions[pair[0]]
+        reported_collisions.add(pair)
+        new_collisions.append((pair, pos1))
+        total_accidents += 1
+        print(f"[ACCIDENT] Vehicles involved: {pair} at position {pos1} (Total accidents: {total_accidents})")
 
     # Register accidents in CEN
     for collision_pair, location in new_collisions:
         accident_id = f"ACC_{total_accidents:03d}"
         x, y = location
-        sim_time = traci.simulation.getTime()
-        source_vehicle = collision_pair[0]
-        cen.register(accident_id, (x, y), sim_time, source_vehicle)
-
-        def detect_accident(veh1, veh2, x, y):
-            """Dummy implementation: returns the current edge of veh1 as the accident edge."""
-            try:
-                return traci.vehicle.getRoadID(veh1)
-            except Exception:
-                return None
-
-        accident_edge = detect_accident(collision_pair[0], collision_pair[1], x, y)
+        sim_time = cache.sim_time
+        accident_edge = detect_accident(collision_pair[0], collision_pair[1], x, y, cache)
+        # Internal junction edges cannot be given a travel time, listeners fall back to ACO for those
+        edge_blocked = bool(accident_edge) and not accident_edge.startswith(':')
+        if edge_blocked:
+            # Let SUMO's native router steer around the crash when vehicles reroute
+            traci.edge.adaptTraveltime(accident_edge, BLOCKED_TRAVEL_TIME)
+        cen.register(accident_id, (x, y), sim_time, collision_pair,
+                     accident_edge=accident_edge, edge_blocked=edge_blocked)
 
             # Collect ambulance positions
-        positions = {}
-        for amb in ambulance_readiness.keys():
-                try:
-                    positions[amb] = traci.vehicle.getPosition(amb)
-                except Exception:
-                    continue
+        positions = {amb: cache.positions[amb] for amb in ambulance_readiness.keys()
+                     if amb in cache.positions}
 
             # GA call
-        best_ambulance = select_best_ambulance(x, y, positions, accident_edge)
+        best_ambulance = select_best_ambulance(x, y, positions, accident_edge, road_ids=cache.road_ids,
+                                               sim_time=cache.sim_time)
 
     # Vehicles listen to CEN broadcasts
     for vid, vehicle in vehicles_dict.items():
-        if vid not in traci.vehicle.getIDList():
+        if vid not in cache.ids:
             continue
-        vehicle.listen_and_reroute(cen, {k:v['position'] for k,v in edge_nodes.items()}, graph, comm_range=V2V_COMMUNICATION_RANGE)
+        vehicle.listen_and_reroute(cen, EDGE_POS_DICT, graph, comm_range=V2V_COMMUNICATION_RANGE,
+                                   position=cache.positions[vid], road_id=cache.road_ids[vid],
+                                   route=cache.routes[vid])
 
     # Periodic CEN broadcast
-    cen.broadcast(traci.simulation.getTime(), vehicles_dict=vehicles_dict, graph=graph, comm_range=V2V_COMMUNICATION_RANGE)
+    cen.broadcast(cache.sim_time, vehicles_dict=vehicles_dict, graph=graph,
+                  comm_range=V2V_COMMUNICATION_RANGE, vehicle_positions=cache.positions)
 
     
     
@@ -1,41 +1,75 @@
 # vehicle.py
 import math
-import traci
+import logging
+from sumo_backend import traci
 import random
 
+# Child of the "sim" logger, so it follows SIM_LOG_LEVEL and its queued handler
+log = logging.getLogger("sim.vehicle")
+
+# Reroute with SUMO's C++ router (honours the travel times set on accident edges); ACO is the fallback
+NATIVE_REROUTE = True
+
 class Vehicle:
+    __slots__ = ('veh_id', 'destination', 'current_edge', 'route', 'accidents_received',
+                 '_log_cursor', '_pending')
+
     def __init__(self, veh_id, destination):
         self.veh_id = veh_id
         self.destination = destination
         self.current_edge = None
-        self.route = []
+        self.route = ()  # edge IDs as a tuple, as SUMO returns them; shared with the snapshot, never copied per step
         self.accidents_received = set()  # track accident IDs already received
-
-    def update_position(self):
+        self._log_cursor = 0  # position in cen.accident_log already pulled into _pending
+        self._pending = []    # accident IDs not yet received (CEN was out of range so far)
+
+    def update_position(self, road_id=None, route=None):
+        """road_id / route: optional values from the caller's subscription snapshot"""
+        if road_id is not None and route is not None:
+            self.current_edge = road_id
+            self.route = route
+            return
         try:
             self.current_edge = traci.vehicle.getRoadID(self.veh_id)
             self.route = traci.vehicle.getRoute(self.veh_id)
-        except:
+        except traci.TraCIException:
             pass
 
-    def distance_to_cen(self, cen_pos):
-        try:
-            veh_pos = traci.vehicle.getPosition(self.veh_id)
-            return math.hypot(veh_pos[0] - cen_pos[0], veh_pos[1] - cen_pos[1])
-        except:
-            return float('inf')
-
-    def listen_and_reroute(self, cen, cen_positions, graph, comm_range=200):
-        self.update_position()
-        try:
-            veh_pos = traci.vehicle.getPosition(self.veh_id)
-        except:
+    def distance_to_cen(self, cen_pos, veh_pos=None):
+        if veh_pos is None:
+            try:
+                veh_pos = traci.vehicle.getPosition(self.veh_id)
+            except traci.TraCIException:
+                return float('inf')
+        return math.hypot(veh_pos[0] - cen_pos[0], veh_pos[1] - cen_pos[1])
+
+    def listen_and_reroute(self, cen, cen_positions, graph, comm_range=200, position=None,
+                           road_id=None, route=None):
+        """position / road_id / route: optional values from the caller's per-step snapshot, each saves a TraCI round trip"""
+        self.update_position(road_id, route)
+
+        # Only accidents registered since the last call, plus ones still out of range, need checking
+        acc_log = cen.accident_log
+        if self._log_cursor < len(acc_log):
+            self._pending.extend(acc_log[self._log_cursor:])
+            self._log_cursor = len(acc_log)
+        if not self._pending:
             return
 
-        for acc_id, data in cen.accidents.items():
+        veh_pos = position
+        if veh_pos is None:
+            try:
+                veh_pos = traci.vehicle.getPosition(self.veh_id)
+            except traci.TraCIException:
+                return
+
+        comm_r2 = comm_range ** 2
+        still_pending = []
+        for acc_id in self._pending:
             # Skip accidents already processed
             if acc_id in self.accidents_received:
                 continue
+            data = cen.accidents[acc_id]
 
             broadcasting_cen_name = data["registered_by_name"]
             broadcasting_edge = data["registered_by_edge"]
@@ -44,30 +78,62 @@ class Vehicle:
             if broadcasting_edge not in cen_positions:
                 continue
 
-            dist = self.distance_to_cen(cen_positions[broadcasting_edge])
-            if dist <= comm_range:
+            cen_pos = cen_positions[broadcasting_edge]
+            d2 = (veh_pos[0] - cen_pos[0]) ** 2 + (veh_pos[1] - cen_pos[1]) ** 2
+            if d2 <= comm_r2:
+                dist = math.sqrt(d2)
                 # Mark accident as received
                 self.accidents_received.add(acc_id)
 
-                print(f"[V2I] Vehicle {self.veh_id} received accident {acc_id} info from CEN {broadcasting_cen_name} "
-                      f"at t={traci.simulation.getTime():.1f}s (distance {dist:.1f})")
+                if log.isEnabledFor(logging.INFO):  # skip the getTime round trip when not logging
+                    log.info("[V2I] Vehicle %s received accident %s info from CEN %s at t=%.1fs (distance %.1f)",
+                             self.veh_id, acc_id, broadcasting_cen_name, traci.simulation.getTime(), dist)
+
+                old_route = self.route  # immutable, so no defensive copy is needed
+                # SUMO only knows to avoid the crash if its edge travel time was raised
+                if NATIVE_REROUTE and data["edge_blocked"] and self.native_reroute(old_route, data["accident_edge"]):
+                    continue
 
                 # Determine the exact edge of the accident
                 accident_edge_actual = self.map_position_to_edge(accident_pos, graph)
-                
+
                 # Compute new route avoiding the accident
-                old_route = list(self.route)
                 new_route = self.aco_reroute(graph, blocked_edge=accident_edge_actual)
 
                 # Only update route if different from current
-                if new_route != old_route:
-                    self.route = new_route
+                if tuple(new_route) != old_route:
+                    self.route = tuple(new_route)
                     try:
                         traci.vehicle.setRoute(self.veh_id, self.route)
-                        print(f"[REROUTE] Vehicle {self.veh_id} old route: {old_route}")
-                        print(f"[REROUTE] Vehicle {self.veh_id} new route: {self.route}")
-                    except traci.exceptions.TraCIException as e:
-                        print(f"[ERROR] Failed to set new route for {self.veh_id}: {e}")
+                        log.info("[REROUTE] Vehicle %s old route: %s", self.veh_id, old_route)
+                        log.info("[REROUTE] Vehicle %s new route: %s", self.veh_id, self.route)
+                    except traci.TraCIException as e:
+                        log.warning("[ERROR] Failed to set new route for %s: %s", self.veh_id, e)
+            else:
+                still_pending.append(acc_id)  # retry once the vehicle is within range
+
+        self._pending = still_pending
+
+    def native_reroute(self, old_route, accident_edge):
+        """
+        Ask SUMO to reroute on its current edge travel times. Returns False, so the caller
+        falls back to ACO, if TraCI refused or the new route still runs over accident_edge.
+        """
+        try:
+            # currentTravelTimes=False keeps the adapted travel time on accident edges
+            traci.vehicle.rerouteTraveltime(self.veh_id, currentTravelTimes=False)
+            new_route = traci.vehicle.getRoute(self.veh_id)
+        except traci.TraCIException as e:
+            log.warning("[ERROR] Native reroute failed for %s: %s", self.veh_id, e)
+            return False
+        # A vehicle already on the accident edge cannot avoid it, any other hit means no detour exists
+        if accident_edge in new_route and accident_edge != self.current_edge:
+            return False
+        self.route = new_route
+        if self.route != old_route:
+            log.info("[REROUTE] Vehicle %s old route: %s", self.veh_id, old_route)
+            log.info("[REROUTE] Vehicle %s new route: %s", self.veh_id, self.route)
+        return True
 
     def map_position_to_edge(self, position, graph):
         x, y = position
@@ -77,7 +143,7 @@ class Vehicle:
             node_pos = neighbors[0][0] if neighbors else node
             dx = x - node_pos[0] if isinstance(node_pos, tuple) else 0
             dy = y - node_pos[1] if isinstance(node_pos, tuple) else 0
-            d = math.hypot(dx, dy)
+            d = dx * dx + dy * dy  # squared, only the argmin matters
             if d < min_dist:
                 min_dist = d
                 nearest_edge = node
@@ -90,6 +156,8 @@ class Vehicle:
         beta = 2.0
         evaporation = 0.1
         pheromone = {edge: 1.0 for edge in graph}
+        # tau ** alpha only changes when pheromone is deposited, so keep it alongside
+        pheromone_power = {edge: 1.0 for edge in graph}
 
         best_route = None
         best_cost = float("inf")
@@ -98,32 +166,21 @@ class Vehicle:
         for _ in range(NUM_ANTS):
             current = self.current_edge
             visited = [current]
+            seen = {current}  # O(1) membership, visited keeps the ordered walk
             cost = 0
 
             for _ in range(MAX_HOPS):
-                neighbors = [(n, c) for n, c in graph.get(current, []) 
-                             if n != blocked_edge and n not in visited]
+                neighbors = [(n, c) for n, c in graph.get(current, [])
+                             if n != blocked_edge and n not in seen]
                 if not neighbors:
                     break
 
-                probs = []
-                for n, c in neighbors:
-                    tau = pheromone.get(n, 1.0) ** alpha
-                    eta = (1.0 / c) ** beta
-                    probs.append(tau * eta)
-                total = sum(probs)
-                probs = [p / total for p in probs]
-
-                r = random.random()
-                cumulative = 0
-                for idx, (n, _) in enumerate(neighbors):
-                    cumulative += probs[idx]
-                    if r <= cumulative:
-                        next_node = n
-                        next_cost = neighbors[idx][1]
-                        break
+                # Roulette-wheel pick; random.choices normalizes the weights itself
+                weights = [pheromone_power.get(n, 1.0) * (1.0 / c) ** beta for n, c in neighbors]
+                next_node, next_cost = random.choices(neighbors, weights=weights)[0]
 
                 visited.append(next_node)
+                seen.add(next_node)
                 cost += next_cost
                 current = next_node
                 if current == destination:
@@ -135,6 +192,7 @@ class Vehicle:
 
             for node in visited:
                 pheromone[node] = (1 - evaporation) * pheromone.get(node, 1.0) + 0.1
+                pheromone_power[node] = pheromone[node] ** alpha
 
         if not best_route:
             best_route = [e for e in self.route if e != blocked_edge]